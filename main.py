@@ -1,15 +1,34 @@
-from fastapi import FastAPI, HTTPException, Query
-import os, time, requests, itertools, json
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
+import os, time, itertools, asyncio, functools, hashlib
+import aiohttp
+import orjson
+import msgspec
+import redis.asyncio as aioredis
+from cachetools import LRUCache, TTLCache
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timezone
-from typing import Dict, Any, List
-
-app = FastAPI()
+from typing import Dict, Any, List, Callable, Awaitable
+try:
+    import fcntl  # POSIX; without it the disk snapshot assumes a single worker
+except ImportError:
+    fcntl = None
 
 # -----------------------------
 # Config
 # -----------------------------
 BASE = "https://api.the-odds-api.com"
 SPORT = "americanfootball_nfl"
+DK = "draftkings"
+PLAYER_PREFIX = "player_"
+DEFAULT_MARKETS = (
+    "player_pass_tds",
+    "player_pass_yds",
+    "player_receptions",
+    "player_reception_yds",
+    "player_rush_yds",
+    "player_anytime_td",
+)
 
 # Multiple keys (rotate)
 _ODDS_KEYS = [
@@ -25,116 +44,359 @@ if not ODDS_API_KEYS:
 
 _key_cycle = itertools.cycle(ODDS_API_KEYS) if ODDS_API_KEYS else None
 
+# keys that ran out of credits are skipped for this long instead of being re-probed every rotation
+KEY_COOLDOWN = int(os.getenv("KEY_COOLDOWN", "3600"))  # seconds
+_exhausted_keys: Dict[str, float] = {}                 # key -> time it was marked exhausted
+
 TTL_EVENTS = int(os.getenv("TTL_EVENTS", "60"))   # seconds
 TTL_PROPS  = int(os.getenv("TTL_PROPS", "60"))    # seconds
-
-# simple in-memory cache (per instance)
-_cache = {
-    "events": {"ts": 0.0, "data": []},  # list of events from /odds
-    "props": {}                         # key: f"{event_id}|{books}|{markets}" -> {ts, data}
-}
-
-# optional tiny disk snapshot so we can serve last-known-good when quota pops mid-day
-DISK_CACHE_PATH = "/tmp/parlay_disk_cache.json"
+PROPS_CACHE_SIZE = int(os.getenv("PROPS_CACHE_SIZE", "1024"))  # max cached event/markets combos
+
+# events lists are re-fetched in the background every TTL_EVENTS - 5 seconds so requests never wait on
+# an expired entry; a bookmakers list nobody has asked for in EVENTS_IDLE seconds stops being refreshed.
+# Each refresh is a billed /odds call, so besides DK only a few lists made of known US books are tracked
+# (the query string is client-controlled).
+EVENTS_IDLE = int(os.getenv("EVENTS_IDLE", "600"))  # seconds
+EVENTS_REFRESH_MAX = 4                               # tracked bookmakers lists besides DK
+KNOWN_BOOKMAKERS = frozenset({
+    "draftkings", "fanduel", "betmgm", "williamhill_us", "betrivers", "fanatics", "espnbet",
+    "hardrockbet", "ballybet", "betparx", "fliff", "windcreek", "bovada", "betonlineag",
+    "mybookieag", "lowvig", "betus", "betanysports",
+})
+_events_used: Dict[str, float] = {}                  # bookmakers -> last time a request read that events list
+
+# max per-event odds requests in flight for one /nfl/props call; kept low so a wide
+# fan-out stays inside the provider's rate limits (cache hits never take a slot)
+PROPS_CONCURRENCY = int(os.getenv("PROPS_CONCURRENCY", "4"))
+
+# in-memory caches (per instance); entries expire after their TTL and the
+# least recently used entry is evicted once maxsize is reached, so memory stays bounded
+EVENTS_CACHE = TTLCache(maxsize=8, ttl=TTL_EVENTS)                 # key: f"events|{books}" -> list of events from /odds
+PROPS_CACHE = TTLCache(maxsize=PROPS_CACHE_SIZE, ttl=TTL_PROPS)    # key: f"{event_id}|{books}|{markets}" -> event odds
+
+# optional Redis shared by all workers (and surviving restarts); unset = per-process caches only
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_PREFIX = "odds:"
+REDIS_LOCK_TTL = 30      # seconds a worker may hold a key's fill lock
+REDIS_WAIT_STEPS = 50    # x 0.1s a worker waits for another worker's fill before fetching itself
+REDIS_TIMEOUT = 0.5      # seconds; a hung Redis raises RedisError (-> local fallback) instead of stalling requests
+
+# one lock per cache key so concurrent misses share a single provider call
+# (entries are [lock, users] and are dropped once nobody holds or waits on them)
+_locks: Dict[str, list] = {}
+
+# optional tiny disk snapshot so we can serve last-known-good when quota pops mid-day.
+# Stored as an append-only log of length-prefixed msgpack frames (4-byte big-endian size + {"k", "v"}),
+# and writes are coalesced: keys updated since the last flush are appended in one write every
+# DISK_FLUSH_INTERVAL seconds (off the request path). The log is compacted once it grows past 2x _MAX_DISK_BYTES.
+# Workers share the file: every append, replay and compaction runs under an flock on DISK_CACHE_PATH + ".lock".
+DISK_CACHE_PATH = "/tmp/parlay_disk_cache.mpk"
+DISK_FLUSH_INTERVAL = 2    # seconds
 _MAX_DISK_BYTES = 800_000  # keep it small to avoid issues
-
-def _disk_cache_read() -> Dict[str, Any]:
+_MAX_DISK_ENTRIES = 256    # in-memory view of the snapshot is an LRU of this many keys
+_disk_dirty: set[str] = set()  # keys set since the last flush
+_mp_enc = msgspec.msgpack.Encoder()
+_mp_dec = msgspec.msgpack.Decoder(dict)
+_disk_bytes = 0  # size of the log file after this process last touched it
+
+def _frame(key: str, value: Any) -> bytes:
+    payload = _mp_enc.encode({"k": key, "v": value})
+    return len(payload).to_bytes(4, "big") + payload
+
+@contextmanager
+def _disk_lock():
+    """Exclusive cross-process lock around the log. Not re-entrant: callees run under the caller's hold."""
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(DISK_CACHE_PATH + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # closing releases the flock
+
+def _replay(buf: bytes, blob: LRUCache) -> int:
+    """Load frames from buf into blob (later frames win); returns the offset after the last good frame."""
+    off, n = 0, len(buf)
+    while off + 4 <= n:
+        end = off + 4 + int.from_bytes(buf[off:off + 4], "big")
+        if end > n:
+            break
+        try:
+            rec = _mp_dec.decode(buf[off + 4:end])
+            blob[rec["k"]] = rec["v"]
+        except Exception:
+            break
+        off = end
+    return off
+
+def _read_log() -> bytes:
     try:
-        if not os.path.exists(DISK_CACHE_PATH):
-            return {}
-        with open(DISK_CACHE_PATH, "r") as f:
-            return json.loads(f.read() or "{}")
+        with open(DISK_CACHE_PATH, "rb") as f:
+            return f.read()
     except Exception:
-        return {}
+        return b""
 
-def _disk_cache_write(blob: Dict[str, Any]) -> None:
+def _disk_cache_read() -> LRUCache:
+    """
+    Replay the log. A torn or corrupt tail is truncated back to the last good frame: appends only happen
+    under _disk_lock, so a partial frame seen while holding it is left over from a crash, not a live writer.
+    """
+    global _disk_bytes
+    blob: LRUCache = LRUCache(maxsize=_MAX_DISK_ENTRIES)
     try:
-        js = json.dumps(blob)
-        # guard size
-        if len(js) > _MAX_DISK_BYTES:
+        with _disk_lock():
+            buf = _read_log()
+            off = _replay(buf, blob)
+            if off < len(buf):
+                os.truncate(DISK_CACHE_PATH, off)
+    except Exception:
+        return blob
+    _disk_bytes = off
+    return blob
+
+def _disk_cache_flush() -> None:
+    """Append one frame per dirty key (its latest value only) in a single write; compact if the log got too big."""
+    global _disk_bytes
+    if not _disk_dirty:
+        return
+    keys = list(_disk_dirty)
+    _disk_dirty.clear()
+    try:
+        frames = []
+        for key in keys:
+            value = _disk_cache.get(key)
+            if value is None:
+                continue  # already evicted from the LRU
+            frame = _frame(key, value)
+            # guard size: one oversized entry is not worth keeping
+            if len(frame) <= _MAX_DISK_BYTES:
+                frames.append(frame)
+        if not frames:
             return
-        with open(DISK_CACHE_PATH, "w") as f:
-            f.write(js)
+        with _disk_lock():
+            fd = os.open(DISK_CACHE_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, b"".join(frames))
+                # other workers append too, so the size comes from the file rather than a local tally
+                _disk_bytes = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if _disk_bytes > 2 * _MAX_DISK_BYTES:
+                _disk_cache_compact()
     except Exception:
         pass
 
+async def _disk_flush_loop() -> None:
+    while True:
+        await asyncio.sleep(DISK_FLUSH_INTERVAL)
+        _disk_cache_flush()
+
+def _disk_cache_compact() -> None:
+    """
+    Rewrite the log with one frame per live key (newest first, up to _MAX_DISK_BYTES); drop the rest.
+    Keys come from the file as well as this process, so other workers' entries survive. Call under _disk_lock.
+    """
+    global _disk_bytes
+    live: LRUCache = LRUCache(maxsize=_MAX_DISK_ENTRIES)
+    _replay(_read_log(), live)
+    for key, value in _disk_cache.items():
+        if key not in live or (value or {}).get("ts", 0) >= (live[key] or {}).get("ts", 0):
+            live[key] = value
+    frames, size = [], 0
+    newest_first = sorted(live.items(), key=lambda kv: (kv[1] or {}).get("ts", 0), reverse=True)
+    for key, value in newest_first:
+        frame = _frame(key, value)
+        if size + len(frame) > _MAX_DISK_BYTES:
+            _disk_cache.pop(key, None)
+            continue
+        frames.append(frame)
+        size += len(frame)
+    tmp = f"{DISK_CACHE_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"".join(reversed(frames)))
+    os.replace(tmp, DISK_CACHE_PATH)
+    _disk_bytes = size
+
 _disk_cache = _disk_cache_read()
 
+# -----------------------------
+# App + shared async client
+# -----------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one pooled aiohttp session for the whole process (httpx stalls under wide fan-out).
+    # aiohttp has no HTTP/2, so connection reuse comes from keep-alive: idle sockets are held
+    # a bit longer than the cache TTLs, so the next refill reuses them instead of re-handshaking.
+    keepalive = max(TTL_EVENTS, TTL_PROPS) + 15
+    app.state.http = aiohttp.ClientSession(
+        base_url=BASE,
+        connector=aiohttp.TCPConnector(
+            limit=64,
+            limit_per_host=32,
+            ttl_dns_cache=300,
+            keepalive_timeout=keepalive,
+            force_close=False,
+        ),
+        # short socket-connect timeout: a dead connection attempt fails fast and rotation moves on.
+        # (not `connect`, which also counts time queued for a free pool slot during a wide fan-out)
+        timeout=aiohttp.ClientTimeout(total=25, sock_connect=5),
+        # odds JSON compresses very well; aiohttp decodes br when the Brotli package is installed
+        headers={"Accept-Encoding": "gzip, br"},
+        auto_decompress=True,
+    )
+    app.state.redis = aioredis.from_url(
+        REDIS_URL,
+        decode_responses=False,
+        socket_connect_timeout=REDIS_TIMEOUT,
+        socket_timeout=REDIS_TIMEOUT,
+    ) if REDIS_URL else None
+    tasks = [asyncio.create_task(_events_refresh_loop()), asyncio.create_task(_disk_flush_loop())]
+    try:
+        yield
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # whatever the flusher had not written yet
+        _disk_cache_flush()
+        await app.state.http.close()
+        if app.state.redis is not None:
+            await app.state.redis.aclose()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
 # -----------------------------
 # Helpers
 # -----------------------------
 def _now() -> float:
     return time.time()
 
-def _rotate_key() -> str:
+_ts_cache = [0, ""]  # [epoch second, ISO string for it]
+
+def _iso_now() -> str:
+    """UTC ISO timestamp at second granularity; reformatted only when the second changes."""
+    s = int(time.time())
+    if s != _ts_cache[0]:
+        _ts_cache[:] = [s, datetime.fromtimestamp(s, timezone.utc).isoformat()]
+    return _ts_cache[1]
+
+def _rotate_key() -> str | None:
+    """Next key in the cycle that is not cooling down; None if every key is."""
     if not _key_cycle:
         raise HTTPException(500, detail="No API keys configured. Add ODDS_API_KEY_1, ODDS_API_KEY_2, ...")
-    return next(_key_cycle)
+    for _ in range(len(ODDS_API_KEYS)):
+        key = next(_key_cycle)
+        marked = _exhausted_keys.get(key)
+        if marked is None or _now() - marked >= KEY_COOLDOWN:
+            return key
+    return None
 
 def _cache_get(mem_key: str):
     return _disk_cache.get(mem_key)
 
 def _cache_set(mem_key: str, data: Any):
+    # written to disk by the next _disk_cache_flush, not on the request path
     _disk_cache[mem_key] = data
-    _disk_cache_write(_disk_cache)
+    _disk_dirty.add(mem_key)
+
+def _is_quota_error(status: int, body: str) -> bool:
+    # The Odds API quota codes often return 402 or body mentions usage/credits
+    return status in (402, 429) or "OUT_OF_USAGE_CREDITS" in body or "quota" in body.lower()
+
+def _is_credit_exhausted(status: int, body: str) -> bool:
+    # only spent credits stick for KEY_COOLDOWN; a bare 429 is usually a rate limit that clears in seconds
+    return status == 402 or "OUT_OF_USAGE_CREDITS" in body
+
+# both take params already scrubbed of apiKey (see safe_params in _provider_get)
+def _provider_error(status: int, body: str, url: str, safe_params: dict) -> HTTPException:
+    # Other provider errors (invalid market, event expired, etc.)
+    return HTTPException(status, detail={
+        "provider_status": status,
+        "provider_body": body,
+        "url": url,
+        "params": safe_params
+    })
+
+def _quota_exhausted(url: str, safe_params: dict) -> HTTPException:
+    return HTTPException(429, detail={
+        "message": "All provider keys exhausted (usage quota). Reduce markets, query one event at a time, or wait for reset.",
+        "url": url,
+        "params": safe_params
+    })
 
-def _provider_get(path: str, params: dict, allow_rotation=True) -> dict:
+async def _provider_get(
+    client: aiohttp.ClientSession,
+    path: str,
+    params: dict,
+    decode: Callable[[bytes], Any] = orjson.loads,
+) -> Any:
     """
     GET with key rotation:
       - tries each key until one succeeds
       - if quota/usage error, rotates to next key
       - if all fail on quota, raises 429 with details
+    The 200 body is handed to `decode` as raw bytes.
     """
     url = f"{BASE}{path}"
+    # scrubbed once for error details; the key only ever goes into the per-attempt qp
+    safe_params = {k:v for k,v in params.items() if k != "apiKey"}
     last_error = None
-    tried = 0
-    total = max(1, len(ODDS_API_KEYS) or 1)
+    # keys used by this call: rotation skips cooling-down keys, so with one key left it would
+    # otherwise hand back that same (rate-limited) key on every attempt
+    tried: set[str] = set()
 
-    while tried < total:
+    while True:
         api_key = _rotate_key()
+        if api_key is None or api_key in tried:
+            # every key is out of quota or already tried; don't spend another round-trip finding out again
+            break
+        tried.add(api_key)
         qp = {"apiKey": api_key, **params}
         try:
-            r = requests.get(url, params=qp, timeout=25)
-        except requests.RequestException as e:
-            last_error = f"Request error: {e}"
-            tried += 1
+            async with client.get(path, params=qp) as r:
+                if r.status == 200:
+                    return decode(await r.read())
+                status = r.status
+                body = (await r.text())[:2000]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            last_error = f"Request error: {e!r}"
             continue
 
-        if r.status_code == 200:
-            return r.json()
-
-        body = r.text[:2000]
-        # The Odds API quota codes often return 402 or body mentions usage/credits
-        if r.status_code in (402, 429) or "OUT_OF_USAGE_CREDITS" in body or "quota" in body.lower():
-            last_error = f"Key exhausted or quota hit. status={r.status_code}, body={body[:220]}"
-            tried += 1
+        if _is_quota_error(status, body):
+            last_error = f"Key exhausted or quota hit. status={status}, body={body[:220]}"
+            if _is_credit_exhausted(status, body):
+                _exhausted_keys[api_key] = _now()
             # rotate and try next key
             continue
 
-        # Other provider errors (invalid market, event expired, etc.)
-        raise HTTPException(r.status_code, detail={
-            "provider_status": r.status_code,
-            "provider_body": body,
-            "url": url,
-            "params": {k:v for k,v in qp.items() if k != "apiKey"}
-        })
+        raise _provider_error(status, body, url, safe_params)
 
     # if we get here, all keys failed on quota
-    raise HTTPException(429, detail={
-        "message": "All provider keys exhausted (usage quota). Reduce markets, query one event at a time, or wait for reset.",
-        "url": url,
-        "params": {k:v for k,v in params.items() if k != "apiKey"}
-    })
-
-def _get(path: str, params: dict, cache_key: str | None = None, ttl: int | None = None) -> dict:
-    """Provider GET with optional cache and disk snapshot fallback on quota."""
-    # serve in-memory event cache separately (kept below)
-    if cache_key and ttl:
-        # try fresh-ish memory cache (your existing in-memory cache applies for events/props too)
-        pass
-
+    raise _quota_exhausted(url, safe_params)
+
+async def _fetch(
+    client: aiohttp.ClientSession,
+    path: str,
+    params: dict,
+    cache_key: str | None = None,
+    shape: Callable[[Any], Any] | None = None,
+    limit: asyncio.Semaphore | None = None,
+    decode: Callable[[bytes], Any] = orjson.loads,
+) -> Any:
+    """
+    Provider GET with disk snapshot write on success and fallback on quota.
+    `shape` trims the payload before it is cached or snapshotted; `limit` bounds concurrent provider calls.
+    """
     try:
-        data = _provider_get(path, params)
+        if limit is None:
+            data = await _provider_get(client, path, params, decode)
+        else:
+            async with limit:
+                data = await _provider_get(client, path, params, decode)
+        if shape:
+            data = shape(data)
         if cache_key:
             _cache_set(cache_key, {"ts": _now(), "data": data})
         return data
@@ -146,54 +408,356 @@ def _get(path: str, params: dict, cache_key: str | None = None, ttl: int | None
                 return snap["data"]
         raise
 
-def _normalize_props(event_json: dict, event_label: str) -> list[dict]:
-    """Flatten bookmakers -> markets -> outcomes into a simple list."""
-    out = []
-    eid = event_json.get("id") or ""
-    for bm in event_json.get("bookmakers", []) or []:
-        if (bm.get("key") or "").lower() != "draftkings":
-            continue
-        for mk in bm.get("markets", []) or []:
-            mkey = (mk.get("key") or "").lower()
-            if not mkey.startswith("player_"):
+@functools.lru_cache(maxsize=256)
+def _parse_markets(markets: str) -> tuple[str, tuple[str, ...], frozenset[str]]:
+    """
+    markets query string -> (cleaned csv for the provider, tuple of keys, frozenset for filtering);
+    parsed once per distinct value.
+    Only player_* keys are kept: anything else would be fetched (and billed) only to be dropped by _normalize_props.
+    """
+    keys = tuple(dict.fromkeys(
+        m for m in (x.strip().lower() for x in markets.split(",")) if m.startswith(PLAYER_PREFIX)
+    ))
+    return ",".join(keys), keys, frozenset(keys)
+
+@functools.lru_cache(maxsize=64)
+def _parse_bookmakers(bookmakers: str) -> str:
+    """bookmakers query string -> canonical csv (lowercased, deduped, sorted), so equal lists share one cache entry."""
+    return ",".join(sorted({b for b in (x.strip().lower() for x in bookmakers.split(",")) if b}))
+
+def _slim_events(data: list) -> list[dict]:
+    """Keep only what the endpoints read from /odds events; the h2h bookmakers blob is dropped."""
+    return [
+        {"id": ev.get("id"), "home_team": ev.get("home_team"), "away_team": ev.get("away_team")}
+        for ev in data or ()
+    ]
+
+# Typed view of /events/{id}/odds holding only the fields _normalize_props reads.
+# msgspec skips everything else while decoding (links, titles, last_update, sids, ...),
+# which roughly halves what each event costs in memory, Redis and the disk snapshot.
+class _Outcome(msgspec.Struct, omit_defaults=True):
+    name: Any = None
+    description: Any = None
+    price: Any = None
+    point: Any = None
+    line: Any = None
+    total: Any = None
+    side: Any = None
+
+class _Market(msgspec.Struct, omit_defaults=True):
+    key: Any = None
+    outcomes: list[_Outcome] | None = None
+
+class _Bookmaker(msgspec.Struct, omit_defaults=True):
+    key: Any = None
+    markets: list[_Market] | None = None
+
+class _EventOdds(msgspec.Struct, omit_defaults=True):
+    id: Any = None
+    bookmakers: list[_Bookmaker] | None = None
+
+_event_odds_dec = msgspec.json.Decoder(_EventOdds)
+
+def _decode_event_odds(body: bytes) -> dict:
+    """Decode an event odds body straight into the slim shape, as plain dicts so every cache tier can store it."""
+    return msgspec.to_builtins(_event_odds_dec.decode(body))
+
+@asynccontextmanager
+async def _key_lock(key: str):
+    """Per-key asyncio.Lock that is discarded when its last user leaves, so _locks can't grow without bound."""
+    entry = _locks.get(key)
+    if entry is None:
+        entry = _locks[key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _locks[key]
+
+async def _shared_get(key: str) -> Any:
+    """Value from the shared Redis cache, or None (no Redis, miss, or Redis unavailable)."""
+    r = app.state.redis
+    if r is None:
+        return None
+    try:
+        raw = await r.get(REDIS_PREFIX + key)
+    except aioredis.RedisError:
+        return None
+    return orjson.loads(raw) if raw is not None else None
+
+async def _shared_fill(key: str, ttl: float, fetch: Callable[[], Awaitable[Any]], refresh: bool) -> Any:
+    """
+    fetch() and publish the result to Redis for the other workers.
+    Without refresh, a SET NX lock makes one worker fetch while the others wait for its value.
+    Redis errors never fail the request; they just fall back to fetching locally.
+    """
+    r = app.state.redis
+    if r is None:
+        return await fetch()
+    rkey = REDIS_PREFIX + key
+    lock_key = rkey + ":lock"
+    leader = True
+    if not refresh:
+        try:
+            leader = bool(await r.set(lock_key, b"1", nx=True, ex=REDIS_LOCK_TTL))
+        except aioredis.RedisError:
+            return await fetch()
+        if not leader:
+            for _ in range(REDIS_WAIT_STEPS):
+                await asyncio.sleep(0.1)
+                data = await _shared_get(key)
+                if data is not None:
+                    return data
+    try:
+        data = await fetch()
+        try:
+            await r.set(rkey, orjson.dumps(data), ex=max(1, int(ttl)))
+        except aioredis.RedisError:
+            pass
+        return data
+    finally:
+        if leader and not refresh:
+            try:
+                await r.delete(lock_key)
+            except aioredis.RedisError:
+                pass
+
+async def _get_cached(cache: TTLCache, key: str, fetch: Callable[[], Awaitable[Any]], refresh: bool = False) -> Any:
+    """
+    Read-through cache with single-flight on misses:
+      - a hit returns without awaiting anything
+      - on a miss, the first caller runs fetch() under the key's lock
+      - callers queued behind it re-check the cache and reuse that result
+      - with REDIS_URL set, workers share results through Redis before going to the provider
+    """
+    if not refresh:
+        data = cache.get(key)
+        if data is not None:
+            return data
+    async with _key_lock(key):
+        if not refresh:
+            data = cache.get(key)
+            if data is not None:
+                return data
+            # another worker's copy: its age is unknown, so it is served but not re-cached locally
+            data = await _shared_get(key)
+            if data is not None:
+                return data
+        data = await _shared_fill(key, cache.ttl, fetch, refresh)
+        cache[key] = data
+        return data
+
+async def _get(
+    client: aiohttp.ClientSession,
+    path: str,
+    params: dict,
+    cache_key: str | None = None,
+    cache: TTLCache | None = None,
+    shape: Callable[[Any], Any] | None = None,
+    limit: asyncio.Semaphore | None = None,
+    refresh: bool = False,
+    decode: Callable[[bytes], Any] = orjson.loads,
+) -> Any:
+    """
+    Provider GET behind every cache layer, in order:
+      memory TTL cache -> Redis (if configured) -> provider (single-flight) -> disk snapshot on quota.
+    Without a cache/cache_key it is a plain _fetch. Cache hits never wait on `limit`.
+    """
+    fetch = lambda: _fetch(client, path, params, cache_key, shape, limit, decode)
+    if cache is None or cache_key is None:
+        return await fetch()
+    return await _get_cached(cache, cache_key, fetch, refresh)
+
+async def _get_events_cached(bookmakers: str = DK, refresh: bool = False, background: bool = False) -> list[dict]:
+    """
+    The only path to the events list: one cached, single-flight /odds fetch shared by every endpoint.
+    Request-path reads (not background ones) keep that list on the refresh loop.
+    """
+    if not background:
+        _track_events_use(bookmakers)
+    return await _get(
+        app.state.http,
+        f"/v4/sports/{SPORT}/odds",
+        {
+            "regions": "us",
+            "bookmakers": bookmakers,
+            "markets": "h2h",        # cheap market to list events
+            "oddsFormat": "american"
+        },
+        cache_key=f"events|{bookmakers}",
+        cache=EVENTS_CACHE,
+        shape=_slim_events,
+        refresh=refresh,
+    )
+
+def _track_events_use(bookmakers: str) -> None:
+    """Mark a (canonical) events list as in use. DK always qualifies; other lists only if they fit the allow-list and cap."""
+    if bookmakers != DK and bookmakers not in _events_used:
+        others = len(_events_used) - (DK in _events_used)
+        if others >= EVENTS_REFRESH_MAX or not KNOWN_BOOKMAKERS.issuperset(bookmakers.split(",")):
+            return
+    _events_used[bookmakers] = _now()
+
+async def _claim_refresh(bookmakers: str, period: int) -> bool:
+    """With Redis, only one worker per period refreshes a given events list; the others read its copy."""
+    r = app.state.redis
+    if r is None:
+        return True
+    try:
+        # the claim lapses just before the next round, so any worker may take that one
+        return bool(await r.set(f"{REDIS_PREFIX}events|{bookmakers}:refresh", b"1", nx=True, ex=max(1, period - 1)))
+    except aioredis.RedisError:
+        return True
+
+async def _events_refresh_loop() -> None:
+    """
+    Stale-while-revalidate for events: re-fetch each recently used list shortly before it expires,
+    so /nfl/events and /nfl/props keep hitting a warm cache. Idle lists are dropped (no quota burn on an
+    idle server) and failures are ignored; the cached list simply ages out as it would without the loop.
+    """
+    period = max(1, TTL_EVENTS - 5)
+    while True:
+        await asyncio.sleep(period)
+        now = _now()
+        for bookmakers, last_used in list(_events_used.items()):
+            if now - last_used > EVENTS_IDLE:
+                _events_used.pop(bookmakers, None)
                 continue
-            for o in mk.get("outcomes", []) or []:
-                player = o.get("description") or o.get("name") or "Unknown Player"
-                line = o.get("point") or o.get("line") or o.get("total")
-                try:
-                    line = float(line) if line is not None else None
-                except Exception:
-                    line = None
-                direction = (o.get("name") or o.get("side") or "").title()
-                if direction not in ("Over", "Under"):
-                    direction = None
-                price = o.get("price")
-                try:
-                    price = int(str(price))
-                except Exception:
+            try:
+                if await _claim_refresh(bookmakers, period):
+                    await _get_events_cached(bookmakers, refresh=True, background=True)
+            except Exception:
+                pass
+
+def _dk_player_markets(event_json: dict, allowed_markets: frozenset[str]):
+    """Yield (market_key, outcomes) for each DraftKings market of an event that was asked for."""
+    # provider keys are already lowercase; only fold case when the fast compare misses
+    for bm in event_json.get("bookmakers") or ():
+        bkey = bm.get("key") or ""
+        if bkey != DK and bkey.lower() != DK:
+            continue
+        for mk in bm.get("markets") or ():
+            mkey = mk.get("key") or ""
+            if mkey not in allowed_markets:
+                mkey = mkey.lower()
+                if mkey not in allowed_markets:
                     continue
+            yield mkey, mk.get("outcomes") or ()
+
+def _to_american(p: Any) -> int | None:
+    """American odds as int ("+120", " -110", 150); None for anything else ("EVEN", 1.5, None, dicts)."""
+    if type(p) is int:
+        return p
+    if isinstance(p, str):
+        s = p.strip()
+        digits = s[1:] if s[:1] in "+-" else s
+        if digits.isdecimal():
+            return int(s)
+    return None
+
+def _to_line(v: Any) -> float | None:
+    """Prop line as float; numbers skip the exception path, anything else gets one float() attempt."""
+    if v is None:
+        return None
+    t = type(v)
+    if t is float:
+        return v
+    if t is int:
+        return float(v)
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
 
-                out.append({
-                    "event_id": eid,
-                    "game": event_label,
-                    "book": "draftkings",
-                    "market": mkey,
-                    "player": player,
-                    "line": line,
-                    "direction": direction,
-                    "odds": price,
-                })
+class Prop(msgspec.Struct, gc=False):
+    """
+    One normalized player prop, encoded as a JSON object in field order.
+    A plain (not array_like) Struct so the response shape is unchanged; gc=False is safe since fields are scalars.
+    """
+    event_id: str
+    game: str
+    book: str
+    market: str
+    player: str
+    line: float | None
+    direction: str | None
+    odds: int
+
+def _market_props(outcomes, eid: str, event_label: str, mkey: str):
+    """
+    Yield a Prop per usable outcome of one market (outcomes without a usable price are skipped).
+    The per-outcome work is inlined with local lookups: this is the hottest loop in the response path.
+    """
+    to_american, to_line = _to_american, _to_line
+    for o in outcomes:
+        get = o.get
+        price = get("price")
+        if type(price) is not int:
+            price = to_american(price)
+            if price is None:
+                continue
+        # inline `or` chains on purpose: measurably cheaper than a generic first-of-keys helper
+        name = get("name")
+        line = get("point") or get("line") or get("total")
+        if type(line) is not float:
+            line = to_line(line)
+        direction = name or get("side") or ""
+        if direction != "Over" and direction != "Under":
+            direction = direction.title()
+            if direction != "Over" and direction != "Under":
+                direction = None
+        yield Prop(eid, event_label, DK, mkey, get("description") or name or "Unknown Player", line, direction, price)
+
+def _normalize_props(event_json: dict, eid: str, event_label: str, allowed_markets: frozenset[str]) -> list[Prop]:
+    """
+    Flatten bookmakers -> markets -> outcomes into a simple list (id and label precomputed by the caller).
+    Only markets in allowed_markets (the parsed player_* request) are kept.
+    """
+    out: list[Prop] = []
+    for mkey, outcomes in _dk_player_markets(event_json, allowed_markets):
+        out.extend(_market_props(outcomes, eid, event_label, mkey))
     return out
 
+# msgspec encodes Prop structs natively (orjson does not know them)
+_json_enc = msgspec.json.Encoder()
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Weak If-None-Match comparison (RFC 9110): W/ prefixes are ignored, "*" matches anything."""
+    inm = request.headers.get("if-none-match")
+    if not inm:
+        return False
+    opaque = etag.removeprefix("W/")
+    return any(t == "*" or t.removeprefix("W/") == opaque for t in (t.strip() for t in inm.split(",")))
+
+def _cacheable_json(request: Request, content: dict, max_age: int, volatile: dict | None = None) -> Response:
+    """
+    JSON response with Cache-Control and a weak ETag over `content`, or a bare 304 when the client's
+    copy is current. `volatile` fields (e.g. a timestamp; keys not in `content`) go in the body but not
+    the ETag, so they don't defeat revalidation. max_age=0 sends no-cache: clients keep the copy but
+    revalidate it on every use (for degraded responses that shouldn't be served from cache).
+    """
+    body = _json_enc.encode(content)
+    etag = 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}" if max_age > 0 else "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if volatile:
+        # splice the volatile fields onto the already-encoded object instead of encoding it twice
+        body = body[:-1] + (b"," if content else b"") + _json_enc.encode(volatile)[1:]
+    return Response(body, media_type="application/json", headers=headers)
+
 # -----------------------------
 # Health
 # -----------------------------
 @app.get("/health")
-def health():
-    return {"ok": True, "provider": "TheOddsAPI", "time": datetime.now(timezone.utc).isoformat()}
+async def health():
+    return ORJSONResponse({"ok": True, "provider": "TheOddsAPI", "time": _iso_now()})
 
 @app.head("/health")
-def health_head():
+async def health_head():
     # lets UptimeRobot/Render health checks use HEAD
     return {}
 
@@ -201,27 +765,15 @@ def health_head():
 # Events (IDs for current/next slate)
 # -----------------------------
 @app.get("/nfl/events")
-def nfl_events(bookmakers: str = "draftkings", refresh: bool = False):
+async def nfl_events(request: Request, bookmakers: str = "draftkings", refresh: bool = False):
     """
     Returns upcoming/current NFL events (uses a cheap market to discover valid event IDs).
     Use these IDs to fetch per-event player props.
     """
-    # serve memory cache unless refresh is requested
-    if (not refresh) and (_now() - _cache["events"]["ts"] < TTL_EVENTS) and _cache["events"]["data"]:
-        data = _cache["events"]["data"]
-    else:
-        data = _get(
-            f"/v4/sports/{SPORT}/odds",
-            {
-                "regions": "us",
-                "bookmakers": bookmakers,
-                "markets": "h2h",        # cheap market to list events
-                "oddsFormat": "american"
-            },
-            cache_key="events",
-            ttl=TTL_EVENTS,
-        )
-        _cache["events"] = {"ts": _now(), "data": data}
+    books = _parse_bookmakers(bookmakers)
+    if not books:
+        raise HTTPException(400, detail="bookmakers must name at least one bookmaker")
+    data = await _get_events_cached(books, refresh)
 
     events_min = []
     for ev in data:
@@ -229,16 +781,15 @@ def nfl_events(bookmakers: str = "draftkings", refresh: bool = False):
         home = ev.get("home_team") or ""
         away = ev.get("away_team") or ""
         events_min.append({"id": ev_id, "matchup": f"{away} @ {home}"})
-    return {"count": len(events_min), "events": events_min}
+    return _cacheable_json(request, {"count": len(events_min), "events": events_min}, TTL_EVENTS)
 
 # -----------------------------
 # Player props (DK-only, aggregated)
 # -----------------------------
 @app.get("/nfl/props")
-def nfl_props_dk(
-    markets: str = Query(
-        "player_pass_tds,player_pass_yds,player_receptions,player_reception_yds,player_rush_yds,player_anytime_td"
-    ),
+async def nfl_props_dk(
+    request: Request,
+    markets: str = Query(",".join(DEFAULT_MARKETS)),
     limit_events: int = Query(8, ge=1, le=16),   # keep smaller to avoid quotas/timeouts
     refresh: bool = Query(False),
 ):
@@ -248,61 +799,76 @@ def nfl_props_dk(
     - limit_events: how many events to fetch
     - refresh: if true, bypasses caches (use sparingly)
     """
-    # 1) get event list (cached)
-    if not refresh and (_now() - _cache["events"]["ts"] < TTL_EVENTS) and _cache["events"]["data"]:
-        events = _cache["events"]["data"][:limit_events]
-    else:
-        events = _get(
-            f"/v4/sports/{SPORT}/odds",
-            {
-                "regions": "us",
-                "bookmakers": "draftkings",
-                "markets": "h2h",
-                "oddsFormat": "american"
-            },
-            cache_key="events",
-            ttl=TTL_EVENTS,
-        )[:limit_events]
-        _cache["events"] = {"ts": _now(), "data": events}
-
-    # 2) for each event, fetch props (cached per event)
-    all_props = []
-    mks = ",".join([m.strip() for m in markets.split(",") if m.strip()])
+    client = app.state.http
+    mks, mks_list, allowed_markets = _parse_markets(markets)
+    if not mks:
+        raise HTTPException(400, detail="markets must include at least one player_* market")
+
+    # 1) get event list (cached, shared with /nfl/events)
+    events = (await _get_events_cached(DK, refresh))[:limit_events]
+
+    # 2) for each event, fetch props (cached per event), misses fetched concurrently
+    sem = asyncio.Semaphore(PROPS_CONCURRENCY)
+    params = {
+        "regions": "us",
+        "bookmakers": "draftkings",
+        "markets": mks,
+        "oddsFormat": "american"
+    }
 
+    # (event id, game label) computed once per event, reused for fetching and normalizing
+    targets = []
     for ev in events:
         eid = ev.get("id")
         if not eid:
             continue
-        key = f"{eid}|draftkings|{mks}"
-        use_cache = (not refresh) and (key in _cache["props"]) and (_now() - _cache["props"][key]["ts"] < TTL_PROPS)
-
-        if use_cache:
-            ev_props = _cache["props"][key]["data"]
-        else:
-            ev_props = _get(
-                f"/v4/sports/{SPORT}/events/{eid}/odds",
-                {
-                    "regions": "us",
-                    "bookmakers": "draftkings",
-                    "markets": mks,
-                    "oddsFormat": "american"
-                },
-                cache_key=key,
-                ttl=TTL_PROPS,
-            )
-            _cache["props"][key] = {"ts": _now(), "data": ev_props}
-
         home = ev.get("home_team") or ""
         away = ev.get("away_team") or ""
-        label = f"{away} @ {home}" if home and away else (ev.get("id") or "")
-        all_props.extend(_normalize_props(ev_props, label))
-
-    return {
-        "provider": "TheOddsAPI",
-        "book": "draftkings",
-        "event_count": len(events),
-        "markets_requested": mks.split(","),
-        "count": len(all_props),
-        "props": all_props[:500],  # cap for response size
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-    }
+        targets.append((eid, f"{away} @ {home}" if home and away else eid))
+
+    results = await asyncio.gather(*(
+        _get(
+            client,
+            f"/v4/sports/{SPORT}/events/{eid}/odds",
+            params,
+            cache_key=f"{eid}|draftkings|{mks}",
+            cache=PROPS_CACHE,
+            limit=sem,
+            refresh=refresh,
+            decode=_decode_event_odds,
+        )
+        for eid, _ in targets
+    ), return_exceptions=True)
+
+    # one bad event (expired, no DK market, ...) shouldn't sink the whole slate;
+    # only surface a provider error when every event failed
+    failed = [(eid, r) for (eid, _), r in zip(targets, results) if isinstance(r, BaseException)]
+    for _, err in failed:
+        if not isinstance(err, HTTPException):
+            raise err
+    if failed and len(failed) == len(targets):
+        raise failed[0][1]
+
+    all_props = []
+    for (eid, label), ev_props in zip(targets, results):
+        if isinstance(ev_props, BaseException):
+            continue
+        all_props.extend(_normalize_props(ev_props, eid, label, allowed_markets))
+
+    # returned as a response directly (as in every handler): msgspec encodes the Prop
+    # structs natively, skipping FastAPI's per-field jsonable_encoder pass
+    return _cacheable_json(
+        request,
+        {
+            "provider": "TheOddsAPI",
+            "book": "draftkings",
+            "event_count": len(targets),
+            "markets_requested": mks_list,
+            "count": len(all_props),
+            "failed_events": [{"id": eid, "status": err.status_code} for eid, err in failed],
+            "props": all_props[:500],  # cap for response size
+        },
+        # a partial slate is not worth caching downstream; clients revalidate until every event loads
+        0 if failed else TTL_PROPS,
+        volatile={"timestamp": _iso_now()},
+    )